@@ -1,6 +1,11 @@
+import csv
+import io
+
+import numpy as np
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 
 # ==================================================
 # CONFIGURAÇÃO DA PÁGINA
@@ -14,39 +19,6 @@ st.set_page_config(
 st.title("📊 Dashboard de Análise de Campanhas")
 st.markdown("---")
 
-# ==================================================
-# UPLOAD DO ARQUIVO
-# ==================================================
-uploaded_file = st.file_uploader("Carregar arquivo CSV", type=["csv", "txt"])
-
-if uploaded_file is None:
-    st.info("👆 Faça upload do arquivo para iniciar")
-    st.stop()
-
-# ==================================================
-# LEITURA DO ARQUIVO (SEPARADOR TAB)
-# ==================================================
-try:
-    uploaded_file.seek(0)
-    df = pd.read_csv(uploaded_file, sep="\t")
-except Exception:
-    st.error("❌ Erro ao ler o arquivo. O separador deve ser TAB (\\t).")
-    st.stop()
-
-st.success(f"✅ Arquivo carregado com sucesso — {len(df)} registros")
-
-# ==================================================
-# DEBUG OPCIONAL
-# ==================================================
-with st.expander("🔍 Estrutura da base"):
-    st.write(df.columns.tolist())
-    st.dataframe(df.head())
-
-# ==================================================
-# LIMPEZA BÁSICA
-# ==================================================
-df.columns = df.columns.str.strip()
-
 # ==================================================
 # MAPA DE PERSONAS (CLUSTER → PERSONA)
 # ==================================================
@@ -62,151 +34,426 @@ mapa_personas = {
     9: "Baixa Renda Endividado"
 }
 
-# Garantir tipo correto do cluster
-df["cluster"] = pd.to_numeric(df["cluster"], errors="coerce").astype("Int64")
+# ==================================================
+# CARGA E LIMPEZA (CACHEADAS POR CONTEÚDO DO ARQUIVO)
+# ==================================================
+AMOSTRA_BYTES = 65536
+
+# Separadores aceitos, na ordem de tentativa quando o Sniffer não decide
+SEPARADORES = ("\t", ";", ",", "|")
 
-# Criar coluna persona a partir do cluster
-df["persona"] = df["cluster"].map(mapa_personas)
+# Strings em buffers Arrow quando o pyarrow está instalado
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    STRING_DTYPE = "string"
+
+# Linhas enviadas ao navegador por página da tabela de dados
+LINHAS_POR_PAGINA = 500
+
+# Colunas calculadas na carga, ocultas na exibição e no download
+COLUNAS_AUXILIARES = ["_success", "_prev", "_resultado"]
+
+
+def detect_encoding(head: bytes, truncada: bool) -> str:
+    """Codificação do arquivo: UTF-8, senão Windows-1252, senão Latin-1.
+
+    Uma amostra só ASCII também é tratada como UTF-8, pois os acentos podem
+    aparecer depois dela; detect_format confirma no arquivo inteiro.
+    """
+    try:
+        head.decode("utf-8")
+        return "utf-8"
+    except UnicodeDecodeError as erro:
+        # Caractere multibyte cortado pelo fim da amostra
+        if truncada and erro.reason == "unexpected end of data":
+            return "utf-8"
+
+    # Fora do UTF-8, arquivos em português vêm quase sempre do Windows/Excel
+    try:
+        head.decode("cp1252")
+        return "cp1252"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def detect_format(file_bytes: bytes) -> tuple[str, str]:
+    """Detecta separador e codificação a partir de uma amostra do início do arquivo."""
+    head = file_bytes[:AMOSTRA_BYTES]
+    truncada = len(file_bytes) > len(head)
+    encoding = detect_encoding(head, truncada)
+
+    if encoding == "utf-8" and truncada:
+        # O leitor do Arrow não valida UTF-8 (bytes inválidos viram colunas
+        # binárias), então o arquivo inteiro é conferido; se falhar, os
+        # acentos estão em Windows-1252 depois da amostra
+        try:
+            file_bytes.decode("utf-8")
+        except UnicodeDecodeError:
+            encoding = "cp1252"
+
+    # Descarta a última linha, possivelmente cortada pela amostra
+    amostra = head.decode(encoding, errors="replace").rsplit("\n", 1)[0]
+
+    try:
+        sep = csv.Sniffer().sniff(amostra, delimiters="".join(SEPARADORES)).delimiter
+    except csv.Error:
+        sep = "\t"
+        # Sonda barata (amostra já decodificada, até 1000 linhas); para no
+        # primeiro separador que produz mais de uma coluna
+        for candidato in SEPARADORES:
+            try:
+                probe = pd.read_csv(io.StringIO(amostra), sep=candidato, nrows=1000)
+            except (pd.errors.ParserError, pd.errors.EmptyDataError):
+                continue
+            if len(probe.columns) > 1:
+                sep = candidato
+                break
+
+    return sep, encoding
+
+
+def read_csv_bytes(file_bytes: bytes, sep: str, encoding: str) -> pd.DataFrame:
+    """Leitor multithread do Arrow quando disponível; senão, engine C."""
+    try:
+        return pd.read_csv(
+            io.BytesIO(file_bytes),
+            sep=sep,
+            encoding=encoding,
+            engine="pyarrow",
+            dtype_backend="pyarrow",
+            cache_dates=True
+        )
+    except (ImportError, ValueError):
+        return pd.read_csv(
+            io.BytesIO(file_bytes),
+            sep=sep,
+            encoding=encoding,
+            engine="c",
+            low_memory=False,
+            cache_dates=True
+        )
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_df(file_bytes: bytes, sep: str | None = None) -> tuple[pd.DataFrame, dict]:
+    """Lê o CSV e aplica a limpeza; roda uma vez por arquivo, não por rerun.
+
+    Retorna também a estrutura do arquivo como enviado (total de registros,
+    colunas e primeiras linhas), antes de qualquer limpeza.
+    """
+    sep_detectado, encoding = detect_format(file_bytes)
+    sep = sep or sep_detectado
+
+    df = read_csv_bytes(file_bytes, sep, encoding)
+
+    estrutura = {
+        "registros": len(df),
+        "colunas": df.columns.tolist(),
+        "amostra": df.head().copy(),
+    }
+
+    # Limpeza básica
+    df.columns = df.columns.str.strip()
+
+    # Garantir tipo correto do cluster e criar persona a partir dele
+    df["cluster"] = pd.to_numeric(df["cluster"], errors="coerce").astype("Int64")
+    df["persona"] = df["cluster"].map(mapa_personas)
+
+    # Remover registros sem persona
+    df = df[df["persona"].notna()]
+
+    # Garantir tipos das variáveis principais
+    df["resultado"] = pd.to_numeric(df["resultado"], errors="coerce").fillna(0)
+    df["previous"] = pd.to_numeric(df["previous"], errors="coerce").fillna(0)
+
+    # Indicadores calculados uma única vez (bool numpy, mesmo com backend Arrow)
+    df["_success"] = (df["resultado"] == 1).to_numpy(dtype=bool)
+    df["_prev"] = (df["previous"] > 0).to_numpy(dtype=bool)
+    df["_resultado"] = pd.Categorical.from_codes(
+        df["_success"].astype("int8"),
+        categories=["Falha", "Sucesso"]
+    )
 
-# Remover registros sem persona
-df = df[df["persona"].notna()]
+    # Categorias sobre strings Arrow: filtros e groupby operam sobre códigos
+    for col in ("persona", "campaign"):
+        df[col] = df[col].astype(STRING_DTYPE).str.strip().astype("category")
+
+    return df, estrutura
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def filter_options(_df: pd.DataFrame, df_key: str) -> dict:
+    """Opções dos filtros, calculadas uma vez por arquivo carregado."""
+    return {
+        "campanhas": ["Todas"] + sorted(_df["campaign"].dropna().unique().tolist()),
+        "personas": ["Todas"] + sorted(_df["persona"].dropna().unique().tolist()),
+    }
 
-# ==================================================
-# GARANTIR TIPOS DAS VARIÁVEIS PRINCIPAIS
-# ==================================================
-df["campaign"] = df["campaign"].astype(str)
-df["resultado"] = pd.to_numeric(df["resultado"], errors="coerce").fillna(0)
-df["previous"] = pd.to_numeric(df["previous"], errors="coerce").fillna(0)
 
 # ==================================================
-# SIDEBAR – FILTROS
+# AGREGAÇÕES (CACHEADAS) E CONSTRUÇÃO DOS GRÁFICOS
 # ==================================================
-st.sidebar.header("🔍 Filtros")
+def agg_persona(df: pd.DataFrame) -> pd.DataFrame:
+    """Quantidade de registros por persona."""
+    return (
+        df
+        .groupby("persona", observed=True)
+        .size()
+        .reset_index(name="Quantidade")
+    )
 
-campanhas = ["Todas"] + sorted(df["campaign"].unique())
-personas = ["Todas"] + sorted(df["persona"].unique())
 
-campanha_sel = st.sidebar.selectbox("Campanha", campanhas)
-persona_sel = st.sidebar.selectbox("Persona", personas)
+def agg_resultado(df: pd.DataFrame) -> pd.DataFrame:
+    """Quantidade de registros por resultado (sucesso/falha)."""
+    return (
+        df["_resultado"]
+        .value_counts(sort=True)
+        .rename_axis("Resultado")
+        .reset_index(name="Quantidade")
+    )
 
-df_filt = df.copy()
 
-if campanha_sel != "Todas":
-    df_filt = df_filt[df_filt["campaign"] == campanha_sel]
+def agg_tabela_persona(df: pd.DataFrame) -> pd.DataFrame:
+    """Total, sucessos e contatos prévios por persona."""
+    return (
+        df
+        .groupby("persona", observed=True, sort=False)
+        .agg(
+            Total=("persona", "size"),
+            Sucessos=("_success", "sum"),
+            Contato_Previo=("_prev", "sum")
+        )
+        .reset_index()
+    )
 
-if persona_sel != "Todas":
-    df_filt = df_filt[df_filt["persona"] == persona_sel]
 
-# ==================================================
-# MÉTRICAS PRINCIPAIS
-# ==================================================
-total = len(df_filt)
+@st.cache_data(max_entries=64, show_spinner=False)
+def build_aggs(_df_filt: pd.DataFrame, df_key: str, campanha: str, persona: str) -> dict:
+    """Agregações do recorte filtrado, cacheadas por (arquivo, filtros).
 
-sucesso = (df_filt["resultado"] == 1).sum()
-contato_previo = (df_filt["previous"] > 0).sum()
+    O DataFrame (prefixo _) não entra no hash: a chave é o identificador do
+    arquivo mais os filtros, que determinam o recorte.
+    """
+    return {
+        "persona": agg_persona(_df_filt),
+        "resultado": agg_resultado(_df_filt),
+        "tabela": agg_tabela_persona(_df_filt),
+    }
 
-taxa_sucesso = (sucesso / total * 100) if total > 0 else 0
-taxa_contato = (contato_previo / total * 100) if total > 0 else 0
 
-c1, c2, c3, c4 = st.columns(4)
+def build_fig_persona(persona_counts: pd.DataFrame):
+    """Gráfico de barras da distribuição por persona."""
+    fig_persona = px.bar(
+        persona_counts,
+        x="persona",
+        y="Quantidade",
+        text="Quantidade"
+    )
 
-c1.metric("Total de Registros", total)
-c2.metric("Taxa de Sucesso", f"{taxa_sucesso:.1f}%")
-c3.metric("Contato Prévio", f"{taxa_contato:.1f}%")
-c4.metric("Personas Únicas", df_filt["persona"].nunique())
+    fig_persona.update_traces(textposition="outside")
+    fig_persona.update_layout(
+        xaxis_title="Persona",
+        showlegend=False
+    )
+    return fig_persona
+
+
+def build_fig_resultado(resultado_counts: pd.DataFrame):
+    """Gráfico de rosca do resultado da campanha."""
+    return go.Figure(
+        go.Pie(
+            labels=resultado_counts["Resultado"],
+            values=resultado_counts["Quantidade"],
+            hole=0.4
+        )
+    )
 
-st.markdown("---")
 
 # ==================================================
-# PERSONA SELECIONADA
+# EXPORTAÇÃO
 # ==================================================
-st.subheader("🧠 Persona")
+def csv_bytes(df: pd.DataFrame) -> bytes:
+    """CSV (UTF-8 com BOM) sem as colunas auxiliares, gerado só no clique."""
+    return (
+        df
+        .drop(columns=COLUNAS_AUXILIARES)
+        .to_csv(index=False)
+        .encode("utf-8-sig")
+    )
 
-if persona_sel != "Todas":
-    st.success(persona_sel)
-else:
-    st.info("Selecione uma persona para visualizar")
 
 # ==================================================
-# GRÁFICO – DISTRIBUIÇÃO POR PERSONA
+# UPLOAD DO ARQUIVO
 # ==================================================
-st.subheader("👥 Distribuição por Persona")
-
-persona_counts = (
-    df_filt
-    .groupby("persona", as_index=False)
-    .size()
-    .rename(columns={"size": "Quantidade"})
-)
+uploaded_file = st.file_uploader("Carregar arquivo CSV", type=["csv", "txt"])
 
-fig_persona = px.bar(
-    persona_counts,
-    x="persona",
-    y="Quantidade",
-    text="Quantidade"
-)
+if uploaded_file is None:
+    st.info("👆 Faça upload do arquivo para iniciar")
+    st.stop()
 
-fig_persona.update_traces(textposition="outside")
-fig_persona.update_layout(
-    xaxis_title="Persona",
-    showlegend=False
-)
+# ==================================================
+# LEITURA DO ARQUIVO (SEPARADOR E CODIFICAÇÃO DETECTADOS)
+# ==================================================
+# O DataFrame limpo fica na sessão: reruns com o mesmo arquivo não o
+# desserializam de novo a partir do cache
+file_key = uploaded_file.file_id
+
+if st.session_state.get("df_key") != file_key:
+    try:
+        st.session_state.df, st.session_state.estrutura = load_df(
+            uploaded_file.getvalue()
+        )
+    except (
+        UnicodeDecodeError,
+        pd.errors.ParserError,
+        pd.errors.EmptyDataError
+    ):
+        st.error("❌ Erro ao ler o arquivo. Verifique o separador e a codificação.")
+        st.stop()
+    except KeyError as erro:
+        st.error(f"❌ Coluna obrigatória ausente: {erro.args[0]}")
+        st.stop()
+    st.session_state.df_key = file_key
+
+df = st.session_state.df
+estrutura = st.session_state.estrutura
+
+st.success(f"✅ Arquivo carregado com sucesso — {estrutura['registros']} registros")
 
-st.plotly_chart(fig_persona, use_container_width=True)
+# ==================================================
+# DEBUG OPCIONAL
+# ==================================================
+with st.expander("🔍 Estrutura da base"):
+    st.write(estrutura["colunas"])
+    st.dataframe(estrutura["amostra"])
 
 # ==================================================
-# GRÁFICO – RESULTADO
+# SIDEBAR – FILTROS
 # ==================================================
-st.subheader("🎯 Resultado da Campanha")
+st.sidebar.header("🔍 Filtros")
 
-resultado_counts = (
-    df_filt["resultado"]
-    .map({1: "Sucesso", 0: "Falha"})
-    .value_counts()
-    .reset_index()
-)
+opcoes = filter_options(df, file_key)
 
-resultado_counts.columns = ["Resultado", "Quantidade"]
+campanha_sel = st.sidebar.selectbox("Campanha", opcoes["campanhas"])
+persona_sel = st.sidebar.selectbox("Persona", opcoes["personas"])
 
-fig_res = px.pie(
-    resultado_counts,
-    values="Quantidade",
-    names="Resultado",
-    hole=0.4
-)
+# Máscara única; sem filtro ativo, df_filt é o próprio df (sem cópia)
+mask = np.ones(len(df), dtype=bool)
 
-st.plotly_chart(fig_res, use_container_width=True)
+if campanha_sel != "Todas":
+    mask &= np.asarray(df["campaign"] == campanha_sel)
+
+if persona_sel != "Todas":
+    mask &= np.asarray(df["persona"] == persona_sel)
+
+df_filt = df if mask.all() else df.loc[mask]
 
 # ==================================================
-# TABELA ANALÍTICA POR PERSONA
+# SEÇÕES
 # ==================================================
-st.subheader("📌 Performance por Persona")
+# st.tabs executa o código de todas as abas a cada rerun; com o seletor,
+# só a seção visível é calculada e renderizada.
+secao = st.radio(
+    "Seção",
+    ["📈 KPIs", "📊 Gráficos", "📋 Tabela"],
+    horizontal=True,
+    label_visibility="collapsed"
+)
+
+if secao == "📈 KPIs":
+    # ==================================================
+    # MÉTRICAS PRINCIPAIS
+    # ==================================================
+    total = len(df_filt)
+
+    sucesso = df_filt["_success"].sum()
+    contato_previo = df_filt["_prev"].sum()
+
+    taxa_sucesso = (sucesso / total * 100) if total > 0 else 0
+    taxa_contato = (contato_previo / total * 100) if total > 0 else 0
+
+    c1, c2, c3, c4 = st.columns(4)
+
+    c1.metric("Total de Registros", total)
+    c2.metric("Taxa de Sucesso", f"{taxa_sucesso:.1f}%")
+    c3.metric("Contato Prévio", f"{taxa_contato:.1f}%")
+    c4.metric("Personas Únicas", df_filt["persona"].nunique())
+
+    st.markdown("---")
+
+    # ==================================================
+    # PERSONA SELECIONADA
+    # ==================================================
+    st.subheader("🧠 Persona")
+
+    if persona_sel != "Todas":
+        st.success(persona_sel)
+    else:
+        st.info("Selecione uma persona para visualizar")
+
+elif secao == "📊 Gráficos":
+    aggs = build_aggs(df_filt, file_key, campanha_sel, persona_sel)
+
+    # ==================================================
+    # GRÁFICO – DISTRIBUIÇÃO POR PERSONA
+    # ==================================================
+    st.subheader("👥 Distribuição por Persona")
 
-tabela_persona = (
-    df_filt
-    .groupby("persona")
-    .agg(
-        Total=("persona", "count"),
-        Sucessos=("resultado", lambda x: (x == 1).sum()),
-        Contato_Previo=("previous", lambda x: (x > 0).sum())
+    # Chave estável: o frontend atualiza a figura em vez de remontá-la
+    st.plotly_chart(
+        build_fig_persona(aggs["persona"]),
+        use_container_width=True,
+        key="persona"
     )
-    .reset_index()
-)
 
-st.dataframe(tabela_persona, use_container_width=True)
+    # ==================================================
+    # GRÁFICO – RESULTADO
+    # ==================================================
+    st.subheader("🎯 Resultado da Campanha")
 
-# ==================================================
-# DADOS FILTRADOS + DOWNLOAD
-# ==================================================
-st.subheader("📋 Dados Filtrados")
+    st.plotly_chart(
+        build_fig_resultado(aggs["resultado"]),
+        use_container_width=True,
+        key="resultado"
+    )
 
-st.dataframe(df_filt, use_container_width=True, height=400)
+else:
+    aggs = build_aggs(df_filt, file_key, campanha_sel, persona_sel)
 
-csv = df_filt.to_csv(index=False).encode("utf-8-sig")
+    # ==================================================
+    # TABELA ANALÍTICA POR PERSONA
+    # ==================================================
+    st.subheader("📌 Performance por Persona")
 
-st.download_button(
-    label="⬇️ Download dados filtrados",
-    data=csv,
-    file_name="dados_filtrados.csv",
-    mime="text/csv"
-)
+    tabela_persona = aggs["tabela"]
+
+    st.dataframe(tabela_persona, use_container_width=True)
+
+    # ==================================================
+    # DADOS FILTRADOS + DOWNLOAD
+    # ==================================================
+    st.subheader("📋 Dados Filtrados")
+
+    # Apenas a página atual é serializada para o navegador
+    n_paginas = max(1, -(-len(df_filt) // LINHAS_POR_PAGINA))
+    pagina = st.number_input("Página", min_value=1, max_value=n_paginas, value=1, step=1)
+    inicio = (pagina - 1) * LINHAS_POR_PAGINA
+    df_pagina = df_filt.iloc[inicio:inicio + LINHAS_POR_PAGINA]
+
+    st.dataframe(
+        df_pagina,
+        use_container_width=True,
+        height=400,
+        column_config={col: None for col in COLUNAS_AUXILIARES}
+    )
+    st.caption(f"Mostrando {len(df_pagina):,} de {len(df_filt):,} registros")
+
+    # Callable: o CSV só é gerado quando o usuário clica em download
+    st.download_button(
+        label="⬇️ Download dados filtrados",
+        data=lambda: csv_bytes(df_filt),
+        file_name="dados_filtrados.csv",
+        mime="text/csv"
+    )